@@ -0,0 +1,50 @@
+import base64
+import hashlib
+import hmac
+import os
+import time
+from typing import Optional
+
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "pickle_secret")
+# Key used to sign admin session tokens. Falls back to one derived from the
+# admin password so every worker signs with the same key without extra config.
+ADMIN_TOKEN_SECRET = os.getenv("ADMIN_TOKEN_SECRET") or hashlib.sha256(
+    f"pickle-admin-token:{ADMIN_PASSWORD}".encode("utf-8")
+).hexdigest()
+# Lifetime of an admin session token in seconds
+ADMIN_TOKEN_TTL = int(os.getenv("ADMIN_TOKEN_TTL", "900"))
+
+
+def check_password(password: Optional[str]) -> bool:
+    if password is None:
+        return False
+    return hmac.compare_digest(password.encode("utf-8"), ADMIN_PASSWORD.encode("utf-8"))
+
+
+def _sign(payload: str) -> bytes:
+    digest = hmac.new(ADMIN_TOKEN_SECRET.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=")
+
+
+def issue_token(ttl: int = ADMIN_TOKEN_TTL) -> dict:
+    """Create a short-lived signed admin token. Format: `admin.<expires_at>.<signature>`."""
+    expires_at = int(time.time()) + ttl
+    payload = f"admin.{expires_at}"
+    return {"token": f"{payload}.{_sign(payload).decode('ascii')}", "expires_at": expires_at}
+
+
+def verify_token(token: Optional[str]) -> bool:
+    """Check signature (constant time) and expiry. Never touches the database."""
+    if not token:
+        return False
+    try:
+        scope, expires_at, signature = token.split(".")
+    except ValueError:
+        return False
+    payload = f"{scope}.{expires_at}"
+    # Headers arrive latin-1 decoded and compare_digest rejects non-ASCII str, so compare bytes
+    if not hmac.compare_digest(signature.encode("latin-1", "replace"), _sign(payload)):
+        return False
+    if scope != "admin" or not expires_at.isdigit():
+        return False
+    return int(expires_at) > time.time()
@@ -0,0 +1,135 @@
+"""Throughput benchmark for the multi-worker server.
+
+Starts gunicorn (gunicorn.conf.py) with 1, 2, 4, ... workers against the
+database in .env, hammers a read endpoint and prints requests/second for each
+worker count. Throughput should grow roughly linearly until workers exceed
+the available cores or the database becomes the bottleneck.
+
+The server runs with its production defaults, including the shared SQLite
+rate limiter. Traffic comes from a fixed pool of --visitors repeat visitors
+(X-Forwarded-For addresses, with TRUSTED_PROXY_HOPS=1) spread over the client
+connections. Requests that exceed a visitor's limit show up as 429s; raise
+--visitors if that happens. Pass --no-rate-limit to measure without it.
+
+Run it on a host with at least as many cores as the largest worker count,
+plus headroom for the client processes.
+
+    python benchmark.py --workers 1 2 4 --duration 10 --path /recipes/
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+HOST = "127.0.0.1"
+
+
+def wait_until_ready(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(HOST, port, timeout=1)
+            conn.request("GET", "/stats")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def client(visitors: list, port: int, path: str, duration: float, results):
+    """One keep-alive connection sending requests back to back on behalf of `visitors`."""
+    conn = http.client.HTTPConnection(HOST, port, timeout=10)
+    done = limited = errors = 0
+    end = time.time() + duration
+    n = 0
+    while time.time() < end:
+        headers = {"X-Forwarded-For": visitors[n % len(visitors)]}
+        n += 1
+        try:
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status == 200:
+                done += 1
+            elif resp.status == 429:
+                limited += 1
+            else:
+                errors += 1
+        except OSError:
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(HOST, port, timeout=10)
+    results.put((done, limited, errors))
+
+
+def run(workers: int, port: int, path: str, duration: float, clients: int, visitors: int, rate_limit: bool):
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        TRUSTED_PROXY_HOPS="1",
+        RATE_LIMIT_ENABLED="true" if rate_limit else "false",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(port)
+        # Clients run in separate processes so the GIL doesn't cap the load
+        results = multiprocessing.Queue()
+        addresses = [f"10.0.{i // 256}.{i % 256}" for i in range(visitors)]
+        procs = [
+            multiprocessing.Process(target=client, args=(addresses[i::clients], port, path, duration, results))
+            for i in range(clients)
+        ]
+        for p in procs:
+            p.start()
+        totals = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+    finally:
+        # SIGTERM exercises the graceful shutdown path
+        server.terminate()
+        server.wait(timeout=60)
+
+    done = sum(t[0] for t in totals)
+    limited = sum(t[1] for t in totals)
+    errors = sum(t[2] for t in totals)
+    return done / duration, limited, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--path", default="/recipes/")
+    parser.add_argument("--clients", type=int, default=None, help="Concurrent clients (default: 4 per worker)")
+    parser.add_argument("--visitors", type=int, default=500, help="Distinct client addresses sending traffic")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-rate-limit", action="store_true", help="Run the server with rate limiting off")
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'429s':>7} {'errors':>7}")
+    baseline = None
+    for workers in args.workers:
+        clients = args.clients or workers * 4
+        # Every connection needs at least one visitor
+        visitors = max(args.visitors, clients)
+        rps, limited, errors = run(
+            workers, args.port, args.path, args.duration, clients, visitors, rate_limit=not args.no_rate_limit
+        )
+        baseline = baseline or rps
+        speedup = rps / baseline if baseline else 0
+        print(f"{workers:>8} {rps:>10.1f} {speedup:>7.2f}x {limited:>7} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,7 +26,38 @@ if "psql" in DATABASE_URL:
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DATABASE_URL)
+# Connection pool sizing. DB_MAX_CONNECTIONS is the budget for the whole app,
+# split evenly across server workers (WEB_CONCURRENCY, set by gunicorn.conf.py)
+# so that adding workers doesn't exhaust the database's connection limit.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "20"))
+per_worker = DB_MAX_CONNECTIONS // WEB_CONCURRENCY
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", max(1, per_worker // 2)))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", max(0, per_worker - DB_POOL_SIZE)))
+
+# Fail at startup rather than run out of connections under load
+if not DATABASE_URL.startswith("sqlite"):
+    if per_worker < 2:
+        raise ValueError(
+            f"DB_MAX_CONNECTIONS={DB_MAX_CONNECTIONS} is too small for {WEB_CONCURRENCY} workers "
+            f"(need at least 2 per worker); raise it or lower WEB_CONCURRENCY"
+        )
+    if WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) > DB_MAX_CONNECTIONS:
+        raise ValueError(
+            f"DB_POOL_SIZE + DB_MAX_OVERFLOW across {WEB_CONCURRENCY} workers exceeds "
+            f"DB_MAX_CONNECTIONS={DB_MAX_CONNECTIONS}"
+        )
+
+if DATABASE_URL.startswith("sqlite"):
+    # SQLite pools don't take size arguments
+    engine = create_engine(DATABASE_URL)
+else:
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+    )
 
 def get_session():
     with Session(engine) as session:
@@ -0,0 +1,30 @@
+# Multi-worker server config: gunicorn -c gunicorn.conf.py main:app
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# One worker per core unless WEB_CONCURRENCY says otherwise, but no more than
+# the database connection budget allows (database.py needs 2 per worker)
+db_max_connections = int(os.getenv("DB_MAX_CONNECTIONS", "20"))
+workers = int(os.getenv("WEB_CONCURRENCY", min(multiprocessing.cpu_count(), max(1, db_max_connections // 2))))
+
+# Workers read these when they import the app (the app isn't preloaded):
+# database.py splits DB_MAX_CONNECTIONS across workers, and the rate limiter
+# and job outbox switch to SQLite files every worker on this host shares.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+os.environ.setdefault("RATE_LIMIT_BACKEND", "sqlite")
+os.environ.setdefault("TASK_OUTBOX_PATH", "tasks_outbox.sqlite3")
+# On Heroku (DYNO is set on every dyno) the socket address is the router, so
+# clients must be told apart by the X-Forwarded-For entry the router appends.
+# Otherwise every visitor shares one rate limit and one failed-login bucket.
+if os.getenv("DYNO"):
+    os.environ.setdefault("TRUSTED_PROXY_HOPS", "1")
+
+# Graceful shutdown: on SIGTERM workers stop accepting connections, finish
+# in-flight requests and run the app's shutdown (draining the job queue).
+# Kept under the 30s most hosts wait before sending SIGKILL.
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "25"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = 5
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from dotenv import load_dotenv
 import os
 
@@ -12,11 +12,17 @@ from models import Recipe, RecipeCreate, RecipeRead, RecipeUpdate, Batch, BatchC
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from datetime import datetime
+from tasks import queue
+import ratelimit
+from ratelimit import RateLimitMiddleware
+import auth
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    queue.start()
     yield
+    queue.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -33,6 +39,9 @@ import os
 if os.getenv("FRONTEND_URL"):
     origins.append(os.getenv("FRONTEND_URL"))
 
+# Added before CORS so that CORS wraps it and 429 responses still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -47,14 +56,36 @@ from sqlalchemy import func
 import hashlib
 import time
 
-ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "pickle_secret")
 CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET", "")
 
-def verify_admin(x_admin_password: str = Header(None)):
-    if x_admin_password != ADMIN_PASSWORD:
+def check_admin_password(request: Request, password: Optional[str]):
+    # Failed attempts are rate limited per client, so the password can't be brute forced
+    wait = ratelimit.auth_failure_wait(request)
+    if wait > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many failed login attempts",
+            headers={"Retry-After": str(max(1, round(wait)))},
+        )
+    if not auth.check_password(password):
+        ratelimit.record_auth_failure(request)
         raise HTTPException(status_code=401, detail="Invalid Admin Password")
+
+def verify_admin(request: Request, x_admin_password: str = Header(None), authorization: str = Header(None)):
+    # Prefer a signed session token (Authorization: Bearer <token>), fall back to the password header
+    if authorization and authorization.startswith("Bearer "):
+        if auth.verify_token(authorization[len("Bearer "):]):
+            return True
+        raise HTTPException(status_code=401, detail="Invalid or expired admin token")
+    check_admin_password(request, x_admin_password)
     return True
 
+@app.post("/admin/session")
+def create_admin_session(request: Request, x_admin_password: str = Header(None)):
+    """Exchange the admin password for a short-lived signed token."""
+    check_admin_password(request, x_admin_password)
+    return auth.issue_token()
+
 @app.get("/stats")
 def get_stats(session: Session = Depends(get_session)):
     total_recipes = session.exec(select(func.count(Recipe.id))).one()
@@ -222,6 +253,11 @@ def create_tasting_note(batch_id: str, note: TastingNoteCreate, session: Session
     session.add(db_note)
     session.commit()
     session.refresh(db_note)
+    queue.enqueue(
+        "tasting_note.created",
+        {"note_id": db_note.id, "batch_id": batch_id},
+        idempotency_key=f"tasting_note.created:{db_note.id}:{db_note.created_at.isoformat()}",
+    )
     return db_note
 
 @app.post("/batches/{batch_id}/images/", response_model=BatchImageBase, dependencies=[Depends(verify_admin)])
@@ -285,8 +321,15 @@ def delete_recipe(recipe_id: int, session: Session = Depends(get_session)):
     recipe = session.get(Recipe, recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
+    # Row IDs can be reused, so the creation time makes the key unique to this recipe
+    created_at = recipe.created_at.isoformat()
     session.delete(recipe)
     session.commit()
+    queue.enqueue(
+        "recipe.deleted",
+        {"recipe_id": recipe_id},
+        idempotency_key=f"recipe.deleted:{recipe_id}:{created_at}",
+    )
     return {"ok": True}
 
 @app.post("/batches/", response_model=BatchRead, dependencies=[Depends(verify_admin)])
@@ -328,6 +371,12 @@ def create_batch(batch: BatchCreate, session: Session = Depends(get_session)):
     session.add(db_batch)
     session.commit()
     session.refresh(db_batch)
+    queue.enqueue(
+        "batch.created",
+        {"batch_id": db_batch.id, "recipe_id": db_batch.recipe_id},
+        # Batch IDs repeat once a batch is deleted and re-made for the same date
+        idempotency_key=f"batch.created:{db_batch.id}:{db_batch.created_at.isoformat()}",
+    )
     return db_batch
 
 @app.patch("/batches/{batch_id}", response_model=BatchRead, dependencies=[Depends(verify_admin)])
@@ -368,3 +417,16 @@ def read_batches_for_recipe(recipe_id: int, session: Session = Depends(get_sessi
     statement = select(Batch).where(Batch.recipe_id == recipe_id).order_by(Batch.made_date.desc())
     batches = session.exec(statement).all()
     return batches
+
+# --- Admin: background jobs ---
+
+@app.get("/admin/jobs", dependencies=[Depends(verify_admin)])
+def list_jobs(status: Optional[str] = None, limit: int = 100):
+    return queue.list(status=status, limit=limit)
+
+@app.get("/admin/jobs/{job_id}", dependencies=[Depends(verify_admin)])
+def read_job(job_id: str):
+    job = queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -0,0 +1,258 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+logger = logging.getLogger("pickle.ratelimit")
+
+# Storage for the token buckets: "memory" (per process) or "sqlite", a local
+# stand-in for a shared store that all workers on one host can see.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "ratelimit.sqlite3")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+# Number of proxies in front of the app that append to X-Forwarded-For (e.g. 1
+# behind the Heroku router). 0 ignores the header and uses the socket address.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+# Idle buckets refill to full and are then dropped; this caps how many are kept
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+# Seconds between sweeps for full (idle) buckets
+RATE_LIMIT_SWEEP_INTERVAL = 60
+# Seconds between writes of each worker's usage to the shared SQLite store
+RATE_LIMIT_SYNC_INTERVAL = float(os.getenv("RATE_LIMIT_SYNC_INTERVAL", "1"))
+# Failed admin password checks per client (tokens per second, burst). Applies
+# wherever the password is checked, to slow down guessing.
+AUTH_FAILURE_RATE = 0.1
+AUTH_FAILURE_BURST = 5
+
+# (method, path prefix, tokens per second, burst). First match wins, so keep
+# the most specific prefixes at the top. Limits apply per client.
+RULES: List[Tuple[str, str, float, int]] = [
+    ("GET", "/stats", 1, 10),
+    ("GET", "/batches", 5, 30),
+    ("GET", "/recipes", 5, 30),
+    ("*", "/", 10, 50),
+]
+
+
+class MemoryBackend:
+    def __init__(self):
+        # key -> (tokens, updated, full_at). A bucket past full_at is the same
+        # as a missing one, so those are swept away.
+        self.buckets: Dict[str, Tuple[float, float, float]] = {}
+        self.lock = threading.Lock()
+        self.last_sweep = time.monotonic()
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token. Returns 0 if allowed, otherwise seconds until a token is available."""
+        now = time.monotonic()
+        with self.lock:
+            self._sweep(now)
+            tokens, updated, _ = self.buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if tokens >= 1:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return wait
+
+    def peek(self, key: str, rate: float, burst: int) -> float:
+        """Like `take`, but without using up a token."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated, _ = self.buckets.get(key, (burst, now, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        return 0 if tokens >= 1 else (1 - tokens) / rate
+
+    def _sweep(self, now: float):
+        if now - self.last_sweep < RATE_LIMIT_SWEEP_INTERVAL and len(self.buckets) < RATE_LIMIT_MAX_BUCKETS:
+            return
+        self.last_sweep = now
+        self.buckets = {k: v for k, v in self.buckets.items() if v[2] > now}
+        if len(self.buckets) >= RATE_LIMIT_MAX_BUCKETS:
+            # Still too many active clients: keep the ones furthest from full
+            keep = sorted(self.buckets.items(), key=lambda kv: kv[1][2], reverse=True)
+            self.buckets = dict(keep[: RATE_LIMIT_MAX_BUCKETS // 2])
+
+
+class SQLiteBackend:
+    """Buckets shared by several worker processes through a SQLite file.
+
+    Requests only touch a local copy of each bucket. A background thread writes
+    the tokens taken since the last sync to the shared file every
+    RATE_LIMIT_SYNC_INTERVAL seconds, in one transaction, and refreshes the
+    local copies with what other workers used. Between syncs each worker may
+    let a client use up to a full burst, so a burst can overshoot; the excess
+    is then carried as debt, which keeps the long-run rate.
+    """
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS bucket "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL DEFAULT 0)"
+        )
+        try:
+            self.conn.execute("ALTER TABLE bucket ADD COLUMN full_at REAL NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        self.conn.execute("CREATE INDEX IF NOT EXISTS bucket_full_at ON bucket (full_at)")
+        # key -> [tokens, updated, rate, burst], and tokens taken since the last sync
+        self.local: Dict[str, list] = {}
+        self.pending: Dict[str, int] = {}
+        self.last_sweep = 0.0
+        # Threads don't survive fork, so this must be created in each worker
+        # (gunicorn.conf.py doesn't preload the app)
+        self.syncer = threading.Thread(target=self._sync_loop, name="ratelimit-sync", daemon=True)
+        self.syncer.start()
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        # Wall clock, since monotonic time is not comparable between processes
+        now = time.time()
+        with self.lock:
+            tokens = self._tokens(key, rate, burst, now)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if tokens >= 1:
+                tokens -= 1
+                self.pending[key] = self.pending.get(key, 0) + 1
+            self.local[key] = [tokens, now, rate, burst]
+        return wait
+
+    def peek(self, key: str, rate: float, burst: int) -> float:
+        """Like `take`, but without using up a token."""
+        now = time.time()
+        with self.lock:
+            tokens = self._tokens(key, rate, burst, now)
+        return 0 if tokens >= 1 else (1 - tokens) / rate
+
+    def _tokens(self, key: str, rate: float, burst: int, now: float) -> float:
+        # Unknown clients start full here; the next sync folds in the shared state
+        tokens, updated = self.local.get(key, (burst, now))[:2]
+        return min(burst, tokens + max(0, now - updated) * rate)
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(RATE_LIMIT_SYNC_INTERVAL)
+            try:
+                self._sync()
+            except sqlite3.Error as e:
+                # Keep limiting from the local copies; the pending counts go out next time
+                logger.warning("Rate limit sync failed: %s", e)
+
+    def _sync(self):
+        now = time.time()
+        with self.lock:
+            buckets = {k: (v[2], v[3]) for k, v in self.local.items()}
+            taken, self.pending = self.pending, {}
+        sweep = now - self.last_sweep >= RATE_LIMIT_SWEEP_INTERVAL
+        if not buckets and not sweep:
+            return
+
+        shared = {}
+        try:
+            # Only take the write lock when there is something to write
+            self.conn.execute("BEGIN IMMEDIATE" if taken or sweep else "BEGIN")
+            try:
+                for key, (rate, burst) in buckets.items():
+                    row = self.conn.execute("SELECT tokens, updated FROM bucket WHERE key = ?", (key,)).fetchone()
+                    tokens, updated = row if row else (burst, now)
+                    # Tokens used by other workers may put the bucket into (bounded) debt
+                    tokens = max(-burst, min(burst, tokens + max(0, now - updated) * rate) - taken.get(key, 0))
+                    if taken.get(key):
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO bucket (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                            (key, tokens, now, now + (burst - tokens) / rate),
+                        )
+                    shared[key] = tokens
+                if sweep:
+                    self.conn.execute("DELETE FROM bucket WHERE full_at <= ?", (now,))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        except Exception:
+            with self.lock:
+                for key, count in taken.items():
+                    self.pending[key] = self.pending.get(key, 0) + count
+            raise
+        if sweep:
+            self.last_sweep = now
+
+        with self.lock:
+            for key, tokens in shared.items():
+                rate, burst = buckets[key]
+                # Tokens taken locally while the sync ran still count against the client
+                tokens -= self.pending.get(key, 0)
+                if tokens >= burst and key not in self.pending:
+                    # Full buckets are the same as missing ones
+                    self.local.pop(key, None)
+                else:
+                    self.local[key] = [tokens, now, rate, burst]
+
+
+def get_backend():
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBackend(RATE_LIMIT_SQLITE_PATH)
+    return MemoryBackend()
+
+
+def match_rule(method: str, path: str) -> Optional[Tuple[str, float, int]]:
+    for rule_method, prefix, rate, burst in RULES:
+        if rule_method in ("*", method) and path.startswith(prefix):
+            return f"{rule_method}:{prefix}", rate, burst
+    return None
+
+
+def client_id(request) -> str:
+    # Clients can put anything at the start of X-Forwarded-For; only the entries
+    # appended by our own proxies (the last TRUSTED_PROXY_HOPS) can be trusted
+    if TRUSTED_PROXY_HOPS:
+        forwarded = [p.strip() for p in request.headers.get("x-forwarded-for", "").split(",") if p.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS:
+            return forwarded[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+# Shared by the middleware and the admin password checks
+backend = get_backend()
+
+
+def auth_failure_wait(request) -> float:
+    """Seconds this client must wait before another admin password check (0 if allowed)."""
+    return backend.peek(f"{client_id(request)}|auth-failure", AUTH_FAILURE_RATE, AUTH_FAILURE_BURST)
+
+
+def record_auth_failure(request):
+    backend.take(f"{client_id(request)}|auth-failure", AUTH_FAILURE_RATE, AUTH_FAILURE_BURST)
+
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    """Token-bucket limiter that rejects excess traffic before it reaches the database."""
+
+    def __init__(self, app, backend=None):
+        super().__init__(app)
+        self.backend = backend or globals()["backend"]
+
+    async def dispatch(self, request, call_next):
+        # Let CORS preflights through untouched
+        if not RATE_LIMIT_ENABLED or request.method == "OPTIONS":
+            return await call_next(request)
+
+        rule = match_rule(request.method, request.url.path)
+        if rule:
+            route_key, rate, burst = rule
+            key = f"{client_id(request)}|{route_key}"
+            wait = self.backend.take(key, rate, burst)
+            if wait > 0:
+                return JSONResponse(
+                    status_code=429,
+                    content={"detail": "Too many requests"},
+                    headers={"Retry-After": str(max(1, round(wait)))},
+                )
+        return await call_next(request)
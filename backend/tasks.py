@@ -0,0 +1,436 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger("pickle.tasks")
+
+# Number of worker threads that run deferred side effects
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "2"))
+# Attempts per job before it is marked as failed
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+# Base delay (seconds) between retries, doubled after every failed attempt
+TASK_RETRY_DELAY = float(os.getenv("TASK_RETRY_DELAY", "0.5"))
+# Optional path to a SQLite file used as a durable outbox. Jobs still pending
+# when the process stops are picked up again on the next startup.
+TASK_OUTBOX_PATH = os.getenv("TASK_OUTBOX_PATH")
+# Finished jobs are forgotten (in memory and in the outbox) after this many
+# seconds, which is also how long an idempotency key blocks a repeat
+TASK_RETENTION = int(os.getenv("TASK_RETENTION", "86400"))
+# Upper bound on jobs kept in memory; the oldest finished ones go first
+TASK_MAX_JOBS = int(os.getenv("TASK_MAX_JOBS", "1000"))
+# Seconds between cleanup passes
+TASK_MAINTENANCE_INTERVAL = float(os.getenv("TASK_MAINTENANCE_INTERVAL", "60"))
+# With an outbox, each worker holds a lease on its unfinished jobs and renews it
+# every third of this period. Jobs whose lease runs out (the worker crashed or
+# was killed) are taken over by another worker.
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "30"))
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+JOB_COLUMNS = "id, name, payload, idempotency_key, status, attempts, error, created_at, updated_at"
+
+_handlers: Dict[str, Callable[[dict], None]] = {}
+
+
+def task(name: str):
+    """Register a function as the handler for jobs called `name`."""
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+class SQLiteOutbox:
+    """Durable job store. Keeps a row per job so unfinished work survives restarts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        # The file may be shared by several server workers, so wait on locks
+        self.conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        # WAL lets readers and a writer work at the same time across processes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS job (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                idempotency_key TEXT UNIQUE,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                owner TEXT,
+                lease_until REAL
+            )
+        """)
+        for column in ("owner TEXT", "lease_until REAL"):
+            try:
+                self.conn.execute(f"ALTER TABLE job ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass  # Column already exists
+        self.conn.commit()
+
+    def insert(self, job: dict, owner: str, lease_until: float) -> bool:
+        """Insert a new job. Returns False if another worker already holds its idempotency key."""
+        try:
+            with self.lock:
+                self.conn.execute(
+                    f"INSERT INTO job ({JOB_COLUMNS}, owner, lease_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job["id"], job["name"], json.dumps(job["payload"]), job["idempotency_key"],
+                        job["status"], job["attempts"], job["error"], job["created_at"], job["updated_at"],
+                        owner, lease_until,
+                    ),
+                )
+                self.conn.commit()
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def claim(self, job: dict, owner: str, lease_until: float) -> bool:
+        """Take over a job whose lease has run out. Only one worker wins when several try at once."""
+        now = datetime.utcnow().isoformat()
+        with self.lock:
+            cur = self.conn.execute(
+                "UPDATE job SET status = ?, updated_at = ?, owner = ?, lease_until = ? "
+                "WHERE id = ? AND status IN (?, ?) AND lease_until < ?",
+                (PENDING, now, owner, lease_until, job["id"], PENDING, RUNNING, time.time()),
+            )
+            self.conn.commit()
+        if cur.rowcount == 1:
+            job.update(status=PENDING, updated_at=now)
+            return True
+        return False
+
+    def renew(self, owner: str, lease_until: float):
+        """Extend the lease on every unfinished job held by `owner`."""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE job SET lease_until = ? WHERE owner = ? AND status IN (?, ?)",
+                (lease_until, owner, PENDING, RUNNING),
+            )
+            self.conn.commit()
+
+    def update(self, job: dict, owner: str) -> bool:
+        """Write a job's progress. Returns False if the row is gone or now held by another worker."""
+        with self.lock:
+            cur = self.conn.execute(
+                "UPDATE job SET status = ?, attempts = ?, error = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                (job["status"], job["attempts"], job["error"], job["updated_at"], job["id"], owner),
+            )
+            self.conn.commit()
+        return cur.rowcount == 1
+
+    def expired(self):
+        """Unfinished jobs whose owner stopped renewing the lease."""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {JOB_COLUMNS} "
+                "FROM job WHERE status IN (?, ?) AND lease_until < ? ORDER BY created_at",
+                (PENDING, RUNNING, time.time()),
+            ).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def find_by_key(self, key: str) -> Optional[dict]:
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {JOB_COLUMNS} "
+                "FROM job WHERE idempotency_key = ?",
+                (key,),
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def find(self, job_id: str) -> Optional[dict]:
+        with self.lock:
+            row = self.conn.execute(f"SELECT {JOB_COLUMNS} FROM job WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def recent(self, status: Optional[str] = None, limit: int = 100):
+        query = f"SELECT {JOB_COLUMNS} FROM job"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def prune(self, before: str):
+        """Delete finished jobs last updated before `before`."""
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM job WHERE status IN (?, ?) AND updated_at < ?",
+                (SUCCEEDED, FAILED, before),
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    @staticmethod
+    def _row_to_job(row) -> dict:
+        job = dict(zip(JOB_COLUMNS.split(", "), row))
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+
+class JobQueue:
+    """In-process queue that runs post-write side effects on a thread pool.
+
+    Jobs are identified by an id and optionally an idempotency key: enqueueing
+    the same key twice returns the existing job instead of running it again.
+    Finished jobs are kept for TASK_RETENTION seconds; with an outbox the
+    history is read from there, so it covers every worker.
+    """
+
+    def __init__(self, workers: int = TASK_WORKERS, outbox_path: Optional[str] = TASK_OUTBOX_PATH):
+        self.workers = workers
+        self.outbox_path = outbox_path
+        self.outbox: Optional[SQLiteOutbox] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.jobs: Dict[str, dict] = {}
+        self.keys: Dict[str, str] = {}
+        # Jobs whose outbox insert failed; they never get an outbox row
+        self.memory_only = set()
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.maintenance: Optional[threading.Thread] = None
+        # Identifies this queue's leases in a shared outbox
+        self.owner = uuid.uuid4().hex
+        self.draining = False
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pickle-task")
+        if self.outbox_path:
+            self.outbox = SQLiteOutbox(self.outbox_path)
+            # Resume anything left over from a previous run
+            self._reclaim()
+        self.draining = False
+        self.stopping.clear()
+        self.maintenance = threading.Thread(target=self._maintenance_loop, name="pickle-task-maintenance", daemon=True)
+        self.maintenance.start()
+
+    def shutdown(self, wait: bool = True):
+        # Drain jobs first; maintenance keeps renewing their leases meanwhile
+        self.draining = True
+        if self.executor:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+        self.stopping.set()
+        if self.maintenance:
+            self.maintenance.join()
+            self.maintenance = None
+        if self.outbox:
+            self.outbox.close()
+            self.outbox = None
+
+    def enqueue(self, name: str, payload: Optional[dict] = None, idempotency_key: Optional[str] = None) -> dict:
+        if name not in _handlers:
+            raise ValueError(f"No task registered for '{name}'")
+
+        if idempotency_key:
+            existing = self._find_by_key(idempotency_key)
+            if existing:
+                return existing
+
+        now = datetime.utcnow().isoformat()
+        job = {
+            "id": uuid.uuid4().hex,
+            "name": name,
+            "payload": payload or {},
+            "idempotency_key": idempotency_key,
+            "status": PENDING,
+            "attempts": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        # Outbox I/O happens outside self.lock so requests don't queue behind
+        # other jobs' status writes
+        if self.outbox:
+            # Callers enqueue after their own commit, so an outbox problem must
+            # not fail the request: fall back to running the job in memory only
+            try:
+                if not self.outbox.insert(job, self.owner, time.time() + TASK_LEASE_SECONDS):
+                    # Same key enqueued concurrently by another worker
+                    existing = self._find_by_key(idempotency_key)
+                    if existing:
+                        return existing
+                    # Its row is unreadable or already pruned; the key is still
+                    # taken, so don't run the job again, just describe it
+                    logger.info("Job for key %s already exists but could not be read back", idempotency_key)
+                    return dict(job, id=None)
+            except sqlite3.Error as e:
+                logger.error("Outbox write failed for job %s (%s), running without it: %s", job["id"], name, e)
+                with self.lock:
+                    self.memory_only.add(job["id"])
+
+        with self.lock:
+            # Another thread in this process may have tracked the same key meanwhile
+            if idempotency_key and idempotency_key in self.keys:
+                return dict(self.jobs[self.keys[idempotency_key]])
+            self._track(job)
+            over_cap = len(self.jobs) > TASK_MAX_JOBS
+
+        if over_cap:
+            self.prune()
+        if self.executor:
+            self.executor.submit(self._run, job["id"])
+        else:
+            # Queue not started (e.g. scripts or tests): run inline
+            self._run(job["id"])
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job)
+        # May belong to another worker sharing the outbox
+        return self.outbox.find(job_id) if self.outbox else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100):
+        if self.outbox:
+            # The outbox sees jobs from every worker
+            return self.outbox.recent(status=status, limit=limit)
+        with self.lock:
+            jobs = [dict(j) for j in self.jobs.values() if status is None or j["status"] == status]
+        jobs.sort(key=lambda j: j["created_at"], reverse=True)
+        return jobs[:limit]
+
+    def prune(self):
+        """Forget finished jobs past the retention period, or the oldest ones above the size cap."""
+        cutoff = (datetime.utcnow() - timedelta(seconds=TASK_RETENTION)).isoformat()
+        with self.lock:
+            finished = sorted(
+                (j for j in self.jobs.values() if j["status"] in (SUCCEEDED, FAILED)),
+                key=lambda j: j["updated_at"],
+            )
+            excess = len(self.jobs) - TASK_MAX_JOBS
+            for job in finished:
+                if job["updated_at"] >= cutoff and excess <= 0:
+                    break
+                del self.jobs[job["id"]]
+                self.memory_only.discard(job["id"])
+                if job["idempotency_key"]:
+                    self.keys.pop(job["idempotency_key"], None)
+                excess -= 1
+        if self.outbox:
+            self.outbox.prune(cutoff)
+
+    def _maintenance_loop(self):
+        interval = min(TASK_MAINTENANCE_INTERVAL, TASK_LEASE_SECONDS / 3)
+        last_prune = time.monotonic()
+        while not self.stopping.wait(interval):
+            try:
+                if self.outbox:
+                    self.outbox.renew(self.owner, time.time() + TASK_LEASE_SECONDS)
+                    if not self.draining:
+                        self._reclaim()
+                if time.monotonic() - last_prune >= TASK_MAINTENANCE_INTERVAL:
+                    last_prune = time.monotonic()
+                    self.prune()
+            except Exception as e:
+                logger.warning("Job maintenance failed: %s", e)
+
+    def _reclaim(self):
+        """Pick up jobs left by a worker that stopped renewing its lease."""
+        for job in self.outbox.expired():
+            if not self.outbox.claim(job, self.owner, time.time() + TASK_LEASE_SECONDS):
+                continue
+            with self.lock:
+                self._track(job)
+            if self.executor:
+                self.executor.submit(self._run, job["id"])
+
+    def _track(self, job: dict):
+        self.jobs[job["id"]] = job
+        if job["idempotency_key"]:
+            self.keys[job["idempotency_key"]] = job["id"]
+
+    def _find_by_key(self, key: str) -> Optional[dict]:
+        with self.lock:
+            job_id = self.keys.get(key)
+            if job_id:
+                return dict(self.jobs[job_id])
+        if self.outbox:
+            # Not tracked locally: it may belong to another worker
+            try:
+                return self.outbox.find_by_key(key)
+            except sqlite3.Error as e:
+                logger.error("Outbox lookup failed for key %s: %s", key, e)
+        return None
+
+    def _persist(self, job: dict):
+        if self.outbox and job["id"] not in self.memory_only:
+            try:
+                if not self.outbox.update(job, self.owner):
+                    logger.warning("Job %s is no longer held by this worker in the outbox", job["id"])
+            except sqlite3.Error as e:
+                # The in-memory record stays correct; the next update retries the write
+                logger.error("Outbox write failed for job %s: %s", job["id"], e)
+
+    def _update(self, job_id: str, **fields):
+        with self.lock:
+            job = self.jobs[job_id]
+            job.update(fields, updated_at=datetime.utcnow().isoformat())
+            job = dict(job)
+        # Each job is only updated from its own worker thread, so writes stay in order
+        self._persist(job)
+        return job
+
+    def _run(self, job_id: str):
+        job = self.get(job_id)
+        handler = _handlers.get(job["name"])
+        delay = TASK_RETRY_DELAY
+
+        while True:
+            job = self._update(job_id, status=RUNNING, attempts=job["attempts"] + 1)
+            try:
+                handler(job["payload"])
+            except Exception as e:
+                logger.warning("Job %s (%s) attempt %d failed: %s", job_id, job["name"], job["attempts"], e)
+                if job["attempts"] >= TASK_MAX_ATTEMPTS:
+                    self._update(job_id, status=FAILED, error=str(e))
+                    return
+                self._update(job_id, status=PENDING, error=str(e))
+                time.sleep(delay)
+                delay *= 2
+            else:
+                self._update(job_id, status=SUCCEEDED, error=None)
+                return
+
+
+queue = JobQueue()
+
+
+# --- Side effects ---
+# Follow-up work for write endpoints. Handlers receive the JSON payload given to
+# `queue.enqueue` and must not rely on the request's database session.
+
+@task("batch.created")
+def on_batch_created(payload: dict):
+    logger.info("Batch %s created for recipe %s", payload["batch_id"], payload["recipe_id"])
+
+@task("tasting_note.created")
+def on_tasting_note_created(payload: dict):
+    logger.info("Tasting note %s added to batch %s", payload["note_id"], payload["batch_id"])
+
+@task("recipe.deleted")
+def on_recipe_deleted(payload: dict):
+    logger.info("Recipe %s deleted", payload["recipe_id"])